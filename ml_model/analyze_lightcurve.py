@@ -1,26 +1,230 @@
 #!/usr/bin/env python3
 """
-Enhanced light curve analysis using lightkurve's BLS
+Enhanced light curve analysis using astropy's BLS
 """
+import os
 import sys
+import csv
 import json
 import pandas as pd
 import numpy as np
 from astropy import units as u
-from lightkurve import LightCurve
+from astropy.timeseries import BoxLeastSquares
+from scipy.ndimage import median_filter
+
+# Trial transit durations (days) for the BLS search. 0.25 d was lightkurve's
+# default; the long-baseline search adds longer transits, but every duration
+# must stay below the 0.5 d minimum trial period
+BLS_DURATIONS = np.array([0.05, 0.1, 0.25])
+LONG_BLS_DURATIONS = np.array([0.05, 0.1, 0.25, 0.45])
+
+# Column-name keywords for auto-detection
+ERROR_KW = frozenset(['error', 'err', 'uncertainty', 'sigma'])
+TIME_KW = frozenset(['bjd', 'jd', 'hjd', 'mjd', 'date', 'epoch'])
+CADENCE_KW = frozenset(['cadence', 'frame', 'index'])
+FLUX_KW = frozenset(['flux', 'intensity', 'mag', 'brightness', 'count', 'signal', 'adu', 'electron'])
+SKIP_KW = frozenset(['bkg', 'background', 'quality', 'pos_corr', 'centr'])
+
+# Opt-in Numba BLS kernel (parallel over the period grid). numba is imported and
+# the kernel compiled only when this is set, so the default path never loads it
+USE_FAST_BLS = os.environ.get('USE_FAST_BLS', '').lower() in ('1', 'true', 'yes')
+
+# Swapped for numba.prange right before the kernel is compiled
+prange = range
+
+def _fast_bls_kernel(t, y, periods, durations, oversample):
+    """
+    Binned BLS with a log-likelihood objective; returns (power, transit_time, depth, duration)
+
+    Each period folds the light curve into bins of min(durations) / oversample
+    and slides a box of each trial duration over the folded bins.
+    """
+    n_periods = periods.shape[0]
+    power = np.zeros(n_periods)
+    transit_time = np.zeros(n_periods)
+    depth = np.zeros(n_periods)
+    duration = np.zeros(n_periods)
+
+    n = t.shape[0]
+    t_ref = t.min()
+    y_mean = y.mean()
+    bin_width = durations.min() / oversample
+
+    for i in prange(n_periods):
+        period = periods[i]
+        n_bins = max(int(np.ceil(period / bin_width)), 1)
+        width = period / n_bins
+
+        # Fold mean-subtracted flux into phase bins
+        bin_sum = np.zeros(n_bins)
+        bin_count = np.zeros(n_bins)
+        for j in range(n):
+            b = min(int(((t[j] - t_ref) % period) / width), n_bins - 1)
+            bin_sum[b] += y[j] - y_mean
+            bin_count[b] += 1.0
+
+        for d in range(durations.shape[0]):
+            k = max(int(durations[d] / width + 0.5), 1)
+            if k >= n_bins:
+                continue
+
+            # Slide the box over the folded bins, wrapping around phase 0
+            s_in = 0.0
+            n_in = 0.0
+            for b in range(k):
+                s_in += bin_sum[b]
+                n_in += bin_count[b]
+            for start in range(n_bins):
+                if start > 0:
+                    end = (start + k - 1) % n_bins
+                    s_in += bin_sum[end] - bin_sum[start - 1]
+                    n_in += bin_count[end] - bin_count[start - 1]
+                n_out = n - n_in
+                if n_in > 0 and n_out > 0:
+                    # Flux is mean-subtracted, so the out-of-transit sum is -s_in
+                    dep = -s_in / n_out - s_in / n_in
+                    # Log-likelihood gain over a flat model with unit weights,
+                    # the same quantity astropy's objective='likelihood' reports
+                    loglike = 0.5 * dep * dep * n_in * n_out / n
+                    if dep > 0 and loglike > power[i]:
+                        power[i] = loglike
+                        depth[i] = dep
+                        duration[i] = durations[d]
+                        transit_time[i] = t_ref + (start + 0.5 * k) * width
+
+    return power, transit_time, depth, duration
+
+_compiled_fast_bls = None
+
+def _load_fast_bls():
+    """Import numba and compile the BLS kernel on first use; None if numba is missing"""
+    global prange, _compiled_fast_bls
+    if _compiled_fast_bls is None:
+        try:
+            import numba
+        except ImportError:
+            return None
+        prange = numba.prange
+        _compiled_fast_bls = numba.njit(parallel=True, fastmath=True, cache=True)(_fast_bls_kernel)
+    return _compiled_fast_bls
+
+def _bls_power(times, fluxes, period_grid, durations):
+    """Run the BLS search; returns (power, transit_time, depth, duration) per trial period"""
+    if USE_FAST_BLS:
+        kernel = _load_fast_bls()
+        if kernel is not None:
+            return kernel(times, fluxes, period_grid, durations, 5)
+        print("USE_FAST_BLS is set but numba is not installed; using astropy BLS", file=sys.stderr)
+
+    # Log-likelihood objective, as lightkurve's to_periodogram used; the SNR
+    # thresholds in the planet loop are calibrated against its power spectrum
+    result = BoxLeastSquares(times, fluxes).power(period_grid, durations, objective='likelihood')
+    return (np.array(result.power, dtype=float), np.asarray(result.transit_time),
+            np.asarray(result.depth), np.asarray(result.duration))
+
+# Integer aliases of a detected period (n*P and P/n for n <= 5). Ratios like 3:2
+# are left alone - they are common for real companions in resonance
+HARMONIC_RATIOS = (1.0, 2.0, 3.0, 4.0, 5.0, 1 / 2, 1 / 3, 1 / 4, 1 / 5)
+
+def _mask_period(power, periods, period, tolerance=0.01):
+    """Set the BLS power around a period and its low-order harmonics to -inf"""
+    for ratio in HARMONIC_RATIOS:
+        harmonic = ratio * period
+        power[np.abs(periods - harmonic) / harmonic < tolerance] = -np.inf
+
+def _keplerian_period_grid(min_period, max_period, time_span, q=0.01, max_points=2000):
+    """
+    Period grid with frequency spacing df ~ q * f^(2/3) / T_span.
+
+    Transit duration scales as P^(1/3), so the duty cycle (and the frequency
+    resolution BLS needs) shrinks at long periods. Integrating dN = df / spacing
+    gives N ~ f^(1/3), i.e. the grid is uniform in f^(1/3).
+    """
+    f_min, f_max = 1.0 / max_period, 1.0 / min_period
+    n_points = int(np.ceil(3.0 * time_span / q * (f_max ** (1 / 3) - f_min ** (1 / 3))))
+    n_points = int(np.clip(n_points, 100, max_points))
+    freqs = np.linspace(f_min ** (1 / 3), f_max ** (1 / 3), n_points) ** 3
+    return 1.0 / freqs[::-1]
+
+def _read_table(csv_path):
+    """Read a delimited light curve table, sniffing the delimiter from the first 8 KB"""
+    try:
+        with open(csv_path, 'r', newline='', errors='replace') as f:
+            sample = f.read(8192)
+        # Comment lines would skew the sniffer's delimiter counts
+        sample = '\n'.join(line for line in sample.splitlines() if not line.lstrip().startswith('#'))
+        sep = csv.Sniffer().sniff(sample, delimiters=',\t;| ').delimiter
+        df = pd.read_csv(csv_path, sep=r'\s+' if sep == ' ' else sep,
+                         on_bad_lines='skip', engine='c', comment='#')
+        if len(df.columns) >= 2 and len(df) > 10:  # Need at least 2 columns and 10 rows
+            return df
+    except (csv.Error, ValueError, pd.errors.ParserError):
+        pass
+
+    # Fall back to trying each delimiter with the lenient python parser
+    df = None
+    for sep in [',', '\t', ';', '|', ' ']:
+        try:
+            df = pd.read_csv(csv_path, sep=sep, on_bad_lines='skip', engine='python', comment='#')
+            if len(df.columns) >= 2 and len(df) > 10:  # Need at least 2 columns and 10 rows
+                break
+        except:
+            continue
+    return df
+
+def _score_columns(block):
+    """Per-column coefficient of variation, monotonicity and non-NaN count of a numeric DataFrame"""
+    arr = block.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(arr)
+    n_valid = valid.sum(axis=0)
+    n = np.maximum(n_valid, 1)
+    mean = np.where(valid, arr, 0.0).sum(axis=0) / n
+    std = np.sqrt((np.where(valid, arr - mean, 0.0) ** 2).sum(axis=0) / n)
+    abs_mean = np.abs(mean)
+    cv = np.divide(std, abs_mean, out=np.zeros_like(std), where=abs_mean != 0)
+
+    # Filling NaN gaps with their neighbours adds zero steps, which keeps the
+    # monotonicity test equivalent to running it on each column's dropna()
+    filled = block.ffill().bfill().to_numpy(dtype=np.float64)
+    steps = np.diff(filled, axis=0)
+    is_monotonic = (steps >= 0).all(axis=0) | (steps <= 0).all(axis=0)
+    return cv, is_monotonic, n_valid
+
+def check_fast_bls():
+    """Compare the Numba kernel's peak period and t0 with astropy's on a synthetic transit"""
+    kernel = _load_fast_bls()
+    if kernel is None:
+        return {"error": "numba is not installed"}
+
+    # 90 days of Kepler long cadence with a 3.7 d, 2000 ppm, ~3 h transit
+    rng = np.random.default_rng(42)
+    times = np.arange(0.0, 90.0, 0.0204)
+    fluxes = 1.0 + rng.normal(0.0, 1e-3, len(times))
+    period, t0, duration = 3.7, 1.3, 0.12
+    phase = ((times - t0) / period + 0.5) % 1.0 - 0.5
+    fluxes[np.abs(phase) * period < duration / 2] -= 2e-3
+
+    period_grid = _keplerian_period_grid(0.5, 50, float(np.ptp(times)), max_points=1500)
+    fast_power, fast_t0, _, _ = kernel(times, fluxes, period_grid, BLS_DURATIONS, 5)
+    ref = BoxLeastSquares(times, fluxes).power(period_grid, BLS_DURATIONS, objective='likelihood')
+
+    fast_peak, ref_peak = np.argmax(fast_power), np.argmax(ref.power)
+    fast_period, ref_period = float(period_grid[fast_peak]), float(period_grid[ref_peak])
+    fast_tt, ref_tt = float(fast_t0[fast_peak]), float(np.asarray(ref.transit_time)[ref_peak])
+    # Transit times agree if they land on the same transit modulo the period
+    dt = (fast_tt - ref_tt + ref_period / 2) % ref_period - ref_period / 2
+
+    return {
+        "injected": {"period": period, "transit_time": t0},
+        "fast": {"period": fast_period, "transit_time": fast_tt},
+        "astropy": {"period": ref_period, "transit_time": ref_tt},
+        "match": bool(abs(fast_period - ref_period) / ref_period < 0.01 and abs(dt) < duration)
+    }
 
 def analyze_lightcurve(csv_path):
     """Analyze a light curve CSV and detect transits using BLS"""
     try:
-        # Try to read CSV with various delimiters and options
-        df = None
-        for sep in [',', '\t', ';', '|', ' ']:
-            try:
-                df = pd.read_csv(csv_path, sep=sep, on_bad_lines='skip', engine='python', comment='#')
-                if len(df.columns) >= 2 and len(df) > 10:  # Need at least 2 columns and 10 rows
-                    break
-            except:
-                continue
+        df = _read_table(csv_path)
 
         if df is None or len(df) < 10:
             return {"error": "Could not parse file or insufficient data"}
@@ -35,24 +239,24 @@ def analyze_lightcurve(csv_path):
             col_lower = str(col).lower().strip()
 
             # Skip error columns entirely
-            if any(keyword in col_lower for keyword in ['error', 'err', 'uncertainty', 'sigma']):
+            if any(keyword in col_lower for keyword in ERROR_KW):
                 error_col = col
                 continue
 
             # Time column detection (avoid corrections)
-            if any(keyword in col_lower for keyword in ['bjd', 'jd', 'hjd', 'mjd', 'date', 'epoch']):
+            if any(keyword in col_lower for keyword in TIME_KW):
                 time_col = col
             elif 'time' in col_lower and 'corr' not in col_lower:  # Avoid timecorr
                 time_col = col
 
             # Cadence detection
-            if any(keyword in col_lower for keyword in ['cadence', 'frame', 'index']):
+            if any(keyword in col_lower for keyword in CADENCE_KW):
                 cadence_col = col
 
             # Flux column detection (very flexible, but avoid error/quality columns)
-            if any(keyword in col_lower for keyword in ['flux', 'intensity', 'mag', 'brightness', 'count', 'signal', 'adu', 'electron']):
+            if any(keyword in col_lower for keyword in FLUX_KW):
                 # Skip background, quality, and position correction columns
-                if any(skip in col_lower for skip in ['bkg', 'background', 'quality', 'pos_corr', 'centr']):
+                if any(keyword in col_lower for keyword in SKIP_KW):
                     continue
 
                 # Prefer PDCSAP (de-trended) > SAP > normalized > any flux
@@ -67,26 +271,13 @@ def analyze_lightcurve(csv_path):
         if not flux_col:
             numeric_cols = df.select_dtypes(include=[np.number]).columns
             if len(numeric_cols) >= 1:
-                # Find column with highest coefficient of variation
-                cv_vals = {}
-                for col in numeric_cols:
-                    try:
-                        data = df[col].dropna()
-                        if len(data) > 10:
-                            cv = np.std(data) / np.abs(np.mean(data)) if np.mean(data) != 0 else 0
-                            cv_vals[col] = cv
-                    except:
-                        continue
-
-                if cv_vals:
-                    # Skip time-like columns (monotonically increasing)
-                    for col in sorted(cv_vals, key=cv_vals.get, reverse=True):
-                        data = df[col].dropna().values
-                        if len(data) > 10:
-                            # Check if monotonic (likely time column)
-                            if not (np.all(np.diff(data) >= 0) or np.all(np.diff(data) <= 0)):
-                                flux_col = col
-                                break
+                # Score all numeric columns in one pass; highest coefficient of
+                # variation wins, skipping time-like (monotonic) columns
+                cv, is_monotonic, n_valid = _score_columns(df[numeric_cols])
+                for j in np.argsort(-cv, kind='stable'):
+                    if n_valid[j] > 10 and not is_monotonic[j]:
+                        flux_col = numeric_cols[j]
+                        break
 
             if not flux_col:
                 return {"error": "Could not automatically detect flux column. Please ensure data has time and flux columns."}
@@ -140,25 +331,30 @@ def analyze_lightcurve(csv_path):
                 fluxes = df[flux_col].values
                 print("Using row index as time (assuming Kepler 29.4 min cadence)", file=sys.stderr)
 
-        # Create LightCurve object
-        lc = LightCurve(time=times, flux=fluxes)
+        times = np.asarray(times, dtype=np.float64)
+        fluxes = np.asarray(fluxes, dtype=np.float64)
+        order = np.argsort(times, kind='stable')
+        times, fluxes = times[order], fluxes[order]
 
         # Normalize
-        lc = lc.normalize()
+        fluxes = fluxes / np.median(fluxes)
 
-        # Remove outliers - but be conservative to preserve transits
-        lc = lc.remove_outliers(sigma=10)
+        # Remove outliers against a moving median - but be conservative to preserve transits
+        residuals = fluxes - median_filter(fluxes, size=30, mode='nearest')
+        residual_std = np.std(residuals)
+        if np.isfinite(residual_std) and residual_std > 0:  # Flat flux has nothing to clip
+            inliers = np.abs(residuals) < 10 * residual_std
+            times, fluxes = times[inliers], fluxes[inliers]
 
         # Downsample large datasets for speed (only if >20k points)
-        if len(lc.time) > 20000:
-            print(f"Downsampling {len(lc.time)} → 20k points for speed", file=sys.stderr)
-            step = len(lc.time) // 20000 + 1
-            lc = lc[::step]
-            print(f"Using {len(lc.time)} points", file=sys.stderr)
+        if len(times) > 20000:
+            print(f"Downsampling {len(times)} → 20k points for speed", file=sys.stderr)
+            step = len(times) // 20000 + 1
+            times, fluxes = times[::step], fluxes[::step]
+            print(f"Using {len(times)} points", file=sys.stderr)
 
         # Detect multiple planets (up to 10)
         planets = []
-        lc_work = lc.copy()
 
         # Determine period search range based on data span
         time_span = float(times.max() - times.min())
@@ -167,22 +363,34 @@ def analyze_lightcurve(csv_path):
         if time_span > 300:
             # For long baseline: search 0.5 to 1/3 of time span (ensure multiple transits)
             max_period = min(time_span / 3.0, 500)  # Cap at 500 days
-            period_grid = np.linspace(0.5, max_period, 2000)
+            period_grid = _keplerian_period_grid(0.5, max_period, time_span, max_points=2000)
+            bls_durations = LONG_BLS_DURATIONS
             print(f"Long baseline detected ({time_span:.1f} days). Searching periods up to {max_period:.1f} days", file=sys.stderr)
         else:
             # Standard short-period search (0.5-50 days)
-            period_grid = np.linspace(0.5, 50, 1500)
+            period_grid = _keplerian_period_grid(0.5, 50, time_span, max_points=1500)
+            bls_durations = BLS_DURATIONS
             print(f"Standard search: 0.5-50 days (data span: {time_span:.1f} days)", file=sys.stderr)
 
-        for i in range(5):  # Max 5 planets
-            # Run BLS on current light curve
-            bls = lc_work.to_periodogram(method='bls', period=period_grid)
-
-            # Calculate SNR
-            bls_power = bls.power.value
-            max_power = bls_power.max()
-            median_power = np.median(bls_power)
-            std_power = np.std(bls_power)
+        # Run BLS on the light curve, then once more on the residual after each
+        # detected planet's box model has been subtracted
+        max_planets = 5
+        bls_periods = period_grid
+        bls_power, bls_t0, bls_depth, bls_duration = _bls_power(times, fluxes, period_grid, bls_durations)
+        bls_search = BoxLeastSquares(times, fluxes)
+        residual = fluxes
+
+        for i in range(max_planets):
+            # Calculate SNR over the periods not yet claimed by a planet
+            valid = np.isfinite(bls_power)
+            if not valid.any():
+                break
+            remaining = bls_power[valid]
+            mid = len(remaining) // 2
+            max_power = remaining.max()
+            # Upper median via selection instead of a full sort
+            median_power = np.partition(remaining, mid)[mid]
+            std_power = remaining.std()
             snr = (max_power - median_power) / std_power if std_power > 0 else 0
 
             # Check if signal is strong enough
@@ -190,51 +398,44 @@ def analyze_lightcurve(csv_path):
             if snr < threshold:
                 break
 
-            # Get planet parameters
-            planet_period = bls.period_at_max_power
-            planet_t0 = bls.transit_time_at_max_power
-            planet_depth = bls.depth_at_max_power
-            transit_duration = 0.1 * planet_period.value * 24  # hours
+            # Get planet parameters at the peak
+            peak = np.argmax(bls_power)
+            period_val = float(bls_periods[peak])
+            t0_val = float(bls_t0[peak])
+            planet_depth = float(bls_depth[peak])
+            transit_duration = 0.1 * period_val * 24  # hours
             planet_radius = np.sqrt(planet_depth) * 109  # Earth radii
 
             planets.append({
-                "orbital_period": float(planet_period.value),
-                "transit_time": float(planet_t0.value),
+                "orbital_period": period_val,
+                "transit_time": t0_val,
                 "transit_depth": float(planet_depth * 1e6),  # ppm
                 "snr": float(snr),
                 "transit_duration": float(transit_duration),
                 "planetary_radius": float(planet_radius),
             })
 
-            # Remove this planet's signal by masking transits
-            try:
-                # Calculate phase for all points
-                period_val = planet_period.value
-                t0_val = planet_t0.value
-                phase = np.mod(lc_work.time.value - t0_val, period_val) / period_val
-
-                # Normalize phase to [-0.5, 0.5]
-                phase = np.where(phase > 0.5, phase - 1, phase)
-
-                # Mask points near phase 0 (transit) - 10% window
-                transit_mask = np.abs(phase) < 0.1
+            if i == max_planets - 1:
+                break
 
-                # Create new light curve without transit points
-                lc_work = lc_work[~transit_mask]
+            # Remove this planet's signal by subtracting its best-fit box model
+            box = bls_search.model(times, period_val, float(bls_duration[peak]), t0_val)
+            residual = residual - box + 1.0
 
-                if len(lc_work.time) < 100:  # Not enough data left
-                    break
-            except Exception as e:
-                print(f"Error masking planet {i+1}: {e}", file=sys.stderr)
-                break
+            # Search the residual, keeping every detected period and its
+            # low-order harmonics out of the new spectrum
+            bls_power, bls_t0, bls_depth, bls_duration = _bls_power(times, residual, period_grid, bls_durations)
+            bls_search = BoxLeastSquares(times, residual)
+            for planet in planets:
+                _mask_period(bls_power, bls_periods, planet["orbital_period"])
 
         results = {
             "detected": len(planets) > 0,
             "num_planets": len(planets),
             "planets": planets,
-            "data_points": len(lc.time),
-            "mean_flux": float(np.mean(lc.flux)),
-            "std_flux": float(np.std(lc.flux))
+            "data_points": len(times),
+            "mean_flux": float(np.mean(fluxes)),
+            "std_flux": float(np.std(fluxes))
         }
 
         # Backward compatibility - include first planet at top level
@@ -251,6 +452,11 @@ if __name__ == '__main__':
         print(json.dumps({"error": "No file path provided"}))
         sys.exit(1)
 
+    if sys.argv[1] == '--check-fast-bls':
+        result = check_fast_bls()
+        print(json.dumps(result))
+        sys.exit(0 if result.get("match") else 1)
+
     csv_path = sys.argv[1]
     result = analyze_lightcurve(csv_path)
     print(json.dumps(result))
@@ -2,10 +2,23 @@
 """
 Convert FITS light curve files to CSV format
 """
+import io
 import sys
-import pandas as pd
 import numpy as np
 
+def _to_csv(time_data, flux_data):
+    """Format finite time/flux pairs as CSV text; returns (csv, points)"""
+    # Masked entries (e.g. from lightkurve) become NaN and are dropped with them
+    time_data = np.ma.filled(np.ma.asarray(time_data, dtype=np.float64), np.nan)
+    flux_data = np.ma.filled(np.ma.asarray(flux_data, dtype=np.float64), np.nan)
+    mask = np.isfinite(time_data) & np.isfinite(flux_data)
+    table = np.column_stack([time_data[mask], flux_data[mask]])
+
+    buf = io.StringIO()
+    # 15 significant digits keep full BJD timestamps intact
+    np.savetxt(buf, table, fmt=('%.15g', '%.10g'), delimiter=',', header='time,flux', comments='')
+    return buf.getvalue(), len(table)
+
 def convert_fits_to_csv(fits_path):
     """Convert a FITS light curve file to CSV format"""
     try:
@@ -14,22 +27,15 @@ def convert_fits_to_csv(fits_path):
             from lightkurve import read
             lc = read(fits_path)
 
-            df = pd.DataFrame({
-                'time': lc.time.value,
-                'flux': lc.flux.value
-            })
-
-            df = df.dropna()
+            csv_content, points = _to_csv(lc.time.value, lc.flux.value)
 
-            if len(df) == 0:
+            if points == 0:
                 return {"error": "No valid data after removing NaN values"}
 
-            csv_content = df.to_csv(index=False)
-
             return {
                 "success": True,
                 "csv": csv_content,
-                "points": len(df),
+                "points": points,
                 "method": "lightkurve"
             }
 
@@ -37,7 +43,9 @@ def convert_fits_to_csv(fits_path):
             # Fallback to astropy with byte order handling
             from astropy.io import fits
 
-            with fits.open(fits_path, memmap=False) as hdul:
+            # Memory-map instead of loading a full in-memory copy of the table; only
+            # the two converted columns are materialized as arrays
+            with fits.open(fits_path, memmap=True) as hdul:
                 data = hdul[1].data
 
                 # Find time column
@@ -59,26 +67,20 @@ def convert_fits_to_csv(fits_path):
                         "error": f"Could not find time/flux columns. Available: {', '.join(data.names)}"
                     }
 
-                # Convert to native byte order to avoid endianness issues
-                time_data = np.array(data[time_col], dtype=np.float64)
-                flux_data = np.array(data[flux_col], dtype=np.float64)
-
-                df = pd.DataFrame({
-                    'time': time_data,
-                    'flux': flux_data
-                })
+                # Convert to native float64 to avoid endianness issues; astype only
+                # copies when a byte swap or upcast is actually needed
+                time_data = data[time_col].astype(np.float64, copy=False)
+                flux_data = data[flux_col].astype(np.float64, copy=False)
 
-                df = df.dropna()
+                csv_content, points = _to_csv(time_data, flux_data)
 
-                if len(df) == 0:
+                if points == 0:
                     return {"error": "No valid data after removing NaN values"}
 
-                csv_content = df.to_csv(index=False)
-
                 return {
                     "success": True,
                     "csv": csv_content,
-                    "points": len(df),
+                    "points": points,
                     "method": "astropy"
                 }
 
@@ -5,15 +5,37 @@ Flask server that loads the trained model and provides prediction endpoints
 """
 
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import functools
 import joblib
 import numpy as np
 import json
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.json)"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
 CORS(app)
 
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
 # Load model and scaler
 MODEL_PATH = 'exoplanet_classifier.pkl'
 SCALER_PATH = 'feature_scaler.pkl'
@@ -29,6 +51,109 @@ with open(STATS_PATH, 'r') as f:
 
 print(f"✅ Model loaded successfully! Test Accuracy: {model_stats['test_accuracy']:.2%}")
 
+# Dataset one-hot columns, in training order (unknown datasets map to all zeros)
+_DATASET_NAMES = np.array(['kepler', 'k2', 'tess'])
+
+def engineer_features(period, radius, depth, snr, duration, dataset):
+    """
+    Build the training feature matrix (one row per planet)
+
+    All arguments are equal-length sequences; dataset holds lower-cased
+    dataset names ("kepler", "k2" or "tess").
+    """
+    period = np.asarray(period, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    depth = np.asarray(depth, dtype=np.float64)
+    snr = np.asarray(snr, dtype=np.float64)
+    duration = np.asarray(duration, dtype=np.float64)
+
+    return np.column_stack([
+        # Raw features
+        period,
+        radius,
+        depth,
+        snr,
+        duration,
+        # Log transforms
+        np.log10(period + 1e-6),
+        np.log10(radius + 1e-6),
+        np.log10(depth + 1e-6),
+        np.log10(snr + 1e-6),
+        # Physical ratios
+        depth / (radius ** 2 + 1e-6),
+        duration / (period + 1e-6),
+        snr / (depth + 1e-6),
+        # Statistical transforms
+        snr ** 2,
+        radius ** 3,
+        # Interactions
+        period * radius,
+        snr * duration,
+        # Dataset one-hot encoding
+        (np.asarray(dataset)[:, None] == _DATASET_NAMES).astype(np.float64)
+    ])
+
+# StandardScaler parameters, applied inline to skip sklearn's per-call validation
+_SCALE_MEAN = scaler.mean_ if scaler.with_mean else 0.0
+_SCALE_STD = scaler.scale_ if scaler.with_std else 1.0
+
+def scale_features(features):
+    """Equivalent of scaler.transform(features)"""
+    return (features - _SCALE_MEAN) / _SCALE_STD
+
+# Warm up the model so the first request doesn't pay for lazy initialization
+model.predict_proba(scale_features(engineer_features([1.0], [1.0], [100.0], [7.0], [1.0], ['kepler'])))
+
+@functools.lru_cache(maxsize=4096)
+def infer(period, radius, depth, snr, duration, dataset):
+    """
+    Classify a single planet; returns (prediction, class probabilities tuple)
+
+    Memoized on the raw inputs, so repeated requests for the same planet
+    (e.g. the UI re-classifying it) skip inference entirely. Only immutable
+    values are cached; callers build their own response objects.
+    """
+    # Engineer features (must match training format exactly)
+    features = engineer_features([period], [radius], [depth], [snr], [duration], [dataset])
+
+    # Scale features
+    features_scaled = scale_features(features)
+
+    # Get prediction
+    # predict() is argmax over predict_proba(); derive it instead of
+    # running the ensemble a second time
+    probabilities = model.predict_proba(features_scaled)[0]
+    prediction = str(model.classes_[np.argmax(probabilities)])
+
+    return prediction, tuple(float(prob) for prob in probabilities)
+
+def classify(period, radius, depth, snr, duration, dataset):
+    """Build the /predict response body for a single planet"""
+    prediction, probabilities = infer(period, radius, depth, snr, duration, dataset)
+
+    # Get confidence (max probability)
+    confidence = max(probabilities)
+
+    # Map to class probabilities
+    class_probs = {
+        str(cls): prob
+        for cls, prob in zip(model.classes_, probabilities)
+    }
+
+    return {
+        'classification': prediction,
+        'confidence': confidence,
+        'probabilities': class_probs,
+        'features_used': {
+            'period': period,
+            'radius': radius,
+            'depth': depth,
+            'snr': snr,
+            'duration': duration,
+            'dataset': dataset
+        }
+    }
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -69,84 +194,7 @@ def predict():
         duration = float(data.get('duration', 0.01))
         dataset = data.get('dataset', '').lower()
 
-        # Engineer features (must match training format exactly)
-        # Log transforms
-        log_period = np.log10(period + 1e-6)
-        log_radius = np.log10(radius + 1e-6)
-        log_depth = np.log10(depth + 1e-6)
-        log_snr = np.log10(snr + 1e-6)
-
-        # Physical ratios
-        transit_depth_ratio = depth / (radius ** 2 + 1e-6)
-        duration_period_ratio = duration / (period + 1e-6)
-        snr_per_depth = snr / (depth + 1e-6)
-
-        # Statistical transforms
-        snr_squared = snr ** 2
-        radius_cubed = radius ** 3
-
-        # Interactions
-        period_radius_product = period * radius
-        snr_duration_product = snr * duration
-
-        # Create enhanced feature vector
-        features = np.array([[
-            # Raw features
-            period,
-            radius,
-            depth,
-            snr,
-            duration,
-            # Log transforms
-            log_period,
-            log_radius,
-            log_depth,
-            log_snr,
-            # Derived ratios
-            transit_depth_ratio,
-            duration_period_ratio,
-            snr_per_depth,
-            # Statistical transforms
-            snr_squared,
-            radius_cubed,
-            # Interactions
-            period_radius_product,
-            snr_duration_product,
-            # Dataset one-hot encoding
-            1.0 if dataset == 'kepler' else 0.0,
-            1.0 if dataset == 'k2' else 0.0,
-            1.0 if dataset == 'tess' else 0.0
-        ]])
-
-        # Scale features
-        features_scaled = scaler.transform(features)
-
-        # Get prediction
-        prediction = model.predict(features_scaled)[0]
-        probabilities = model.predict_proba(features_scaled)[0]
-
-        # Get confidence (max probability)
-        confidence = float(max(probabilities))
-
-        # Map to class probabilities
-        class_probs = {
-            cls: float(prob)
-            for cls, prob in zip(model.classes_, probabilities)
-        }
-
-        return jsonify({
-            'classification': prediction,
-            'confidence': confidence,
-            'probabilities': class_probs,
-            'features_used': {
-                'period': period,
-                'radius': radius,
-                'depth': depth,
-                'snr': snr,
-                'duration': duration,
-                'dataset': dataset
-            }
-        })
+        return jsonify(classify(period, radius, depth, snr, duration, dataset))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -171,40 +219,33 @@ def predict_batch():
         if not planets:
             return jsonify({'error': 'No planets provided'}), 400
 
-        results = []
-
-        for planet_data in planets:
-            # Extract features
-            period = float(planet_data.get('period', 0.0))
-            radius = float(planet_data.get('radius', 0.0))
-            depth = float(planet_data.get('depth', 0.0))
-            snr = float(planet_data.get('snr', 7.0))
-            duration = float(planet_data.get('duration', 0.0))
-            dataset = planet_data.get('dataset', '').lower()
-
-            # Create feature vector
-            features = np.array([[
-                period,
-                radius,
-                depth,
-                snr,
-                duration,
-                1.0 if dataset == 'kepler' else 0.0,
-                1.0 if dataset == 'k2' else 0.0,
-                1.0 if dataset == 'tess' else 0.0
-            ]])
-
-            # Scale and predict
-            features_scaled = scaler.transform(features)
-            prediction = model.predict(features_scaled)[0]
-            probabilities = model.predict_proba(features_scaled)[0]
-            confidence = float(max(probabilities))
-
-            results.append({
+        # Gather raw values in a single pass, then engineer, scale and
+        # predict the whole batch at once
+        raw = np.empty((len(planets), 5), dtype=np.float64)
+        datasets = []
+        for i, planet_data in enumerate(planets):
+            raw[i] = (
+                float(planet_data.get('period', 0.0)),
+                float(planet_data.get('radius', 0.0)),
+                float(planet_data.get('depth', 0.0)),
+                float(planet_data.get('snr', 7.0)),
+                float(planet_data.get('duration', 0.0))
+            )
+            datasets.append(planet_data.get('dataset', '').lower())
+
+        features = engineer_features(*raw.T, datasets)
+        features_scaled = scale_features(features)
+        probabilities = model.predict_proba(features_scaled)
+        predictions = model.classes_[np.argmax(probabilities, axis=1)]
+
+        results = [
+            {
                 'classification': prediction,
-                'confidence': confidence,
+                'confidence': float(probs.max()),
                 'planet_data': planet_data
-            })
+            }
+            for prediction, probs, planet_data in zip(predictions, probabilities, planets)
+        ]
 
         return jsonify({
             'predictions': results,